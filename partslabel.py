@@ -1,14 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import bisect
+import concurrent.futures
+import pickle
 import os
 import re
 import io
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer, Paragraph, PageBreak
 from reportlab.lib.units import cm
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
 
 # Configure Streamlit page
 st.set_page_config(
@@ -17,479 +20,495 @@ st.set_page_config(
     layout="wide"
 )
 
-# Style definitions
-bold_style_v1 = ParagraphStyle(
-    name='Bold_v1',
-    fontName='Helvetica-Bold',
-    fontSize=10,
-    alignment=TA_LEFT,
-    leading=20,
-    spaceBefore=2,
-    spaceAfter=2
-)
-
-bold_style_v2 = ParagraphStyle(
-    name='Bold_v2',
-    fontName='Helvetica-Bold',
-    fontSize=10,
-    alignment=TA_LEFT,
-    leading=12,
-    spaceBefore=0,
-    spaceAfter=15,
-)
+# Precompiled column-detection patterns (compiled once, reused by both generators)
+_PART_NO_RE = re.compile(r'PART.*(?:NO|NUM|#)')
+_PART_FALLBACK_RE = re.compile(r'^(?:PARTNO|PART)$')
+_DESC_RE = re.compile(r'DESC')
+_LOC_RE = re.compile(r'LOC|POS')
+
+def find_label_columns(df):
+    """Uppercase the DataFrame columns in place and locate the part number,
+    description and location columns in a single pass, falling back to
+    positional columns when no name matches."""
+    df.columns = df.columns.str.upper()
+    cols = df.columns.tolist()
 
-desc_style = ParagraphStyle(
-    name='Description',
-    fontName='Helvetica',
-    fontSize=20,
-    alignment=TA_LEFT,
-    leading=16,
-    spaceBefore=2,
-    spaceAfter=2
-)
+    part_no_col = desc_col = loc_col = None
+    part_fallback = None
+    for col in cols:
+        if part_no_col is None and _PART_NO_RE.search(col):
+            part_no_col = col
+        if part_fallback is None and _PART_FALLBACK_RE.match(col):
+            part_fallback = col
+        if desc_col is None and _DESC_RE.search(col):
+            desc_col = col
+        if loc_col is None and _LOC_RE.search(col):
+            loc_col = col
 
-def format_part_no_v1(part_no):
-    """Format part number with first 7 characters in 17pt font, rest in 22pt font."""
-    if not part_no or not isinstance(part_no, str):
-        part_no = str(part_no)
+    if not part_no_col:
+        part_no_col = part_fallback or cols[0]
+    if not desc_col:
+        desc_col = cols[1] if len(cols) > 1 else part_no_col
+    if not loc_col:
+        loc_col = cols[2] if len(cols) > 2 else desc_col
 
-    if len(part_no) > 5:
-        split_point = len(part_no) - 5
-        part1 = part_no[:split_point]
-        part2 = part_no[-5:]
-        return Paragraph(f"<b><font size=17>{part1}</font><font size=22>{part2}</font></b>", bold_style_v1)
+    return part_no_col, desc_col, loc_col
+
+# Invariant label geometry, computed once at import. The layout is a fixed
+# grid, so every cell rectangle is known up front and labels are drawn
+# straight onto the canvas with no Platypus wrap/split machinery.
+_PAGE_WIDTH, _PAGE_HEIGHT = A4
+_PAGE_MARGIN = 72  # matches the old SimpleDocTemplate default margins
+
+_PART_NO_HEIGHT_V1 = 1.3 * cm
+_DESC_LOC_HEIGHT_V1 = 0.8 * cm
+_PART_NO_HEIGHT_V2 = 1.9 * cm
+_DESC_HEIGHT_V2 = 2.1 * cm
+_LOC_HEIGHT_V2 = 0.9 * cm
+
+_LABEL_WIDTH = 15 * cm
+_FIELD_COL_WIDTH = 4 * cm
+_VALUE_COL_WIDTH = 11 * cm
+_LABEL_X = (_PAGE_WIDTH - _LABEL_WIDTH) / 2  # tables were centred
+_LABEL_TOP = _PAGE_HEIGHT - _PAGE_MARGIN
+_CELL_PADDING = 5
+
+# Full label heights including the trailing spacers between labels
+_LABEL_HEIGHT_V1 = (2 * (_PART_NO_HEIGHT_V1 + _DESC_LOC_HEIGHT_V1)
+                    + 0.3 * cm + _DESC_LOC_HEIGHT_V1 + 0.2 * cm)
+_LABEL_HEIGHT_V2 = (_PART_NO_HEIGHT_V2 + _DESC_HEIGHT_V2
+                    + 0.3 * cm + _LOC_HEIGHT_V2 + 0.2 * cm)
+
+_LOC_COLORS = [
+    colors.HexColor('#E9967A'),
+    colors.HexColor('#ADD8E6'),
+    colors.HexColor('#90EE90'),
+    colors.HexColor('#FFD700'),
+    colors.HexColor('#ADD8E6'),
+    colors.HexColor('#E9967A'),
+    colors.HexColor('#90EE90')
+]
+
+def _make_loc_widths(col_proportions):
+    """Distribute the 11cm value area across the seven location columns."""
+    total_proportion = sum(col_proportions)
+    return [_FIELD_COL_WIDTH] + [w * _VALUE_COL_WIDTH / total_proportion
+                                 for w in col_proportions]
+
+_LOC_WIDTHS_V1 = _make_loc_widths([1.8, 2.7, 1.3, 1.3, 1.3, 1.3, 1.3])
+_LOC_WIDTHS_V2 = _make_loc_widths([1.7, 2.9, 1.3, 1.2, 1.3, 1.3, 1.3])
+
+# Description font size by text length: inclusive upper bounds looked up
+# with bisect instead of an if/elif ladder
+_DESC_SIZE_BOUNDS = [30, 50, 70, 90]
+_DESC_SIZES = [15, 13, 11, 10, 9]
+
+def _desc_font_size(desc_length):
+    """Pick the v1 description font size for a text of the given length."""
+    return _DESC_SIZES[bisect.bisect_left(_DESC_SIZE_BOUNDS, desc_length)]
+
+def _location_groups(loc_arr):
+    """Sort the location keys once and return (order, locs_sorted, starts,
+    bounds): the stable sort order, the sorted keys, each group's offset
+    into the sorted order and the group boundary array.
+
+    One C-level sort plus a linear boundary scan stands in for groupby's
+    per-group bookkeeping and sub-DataFrame slicing."""
+    order = np.argsort(loc_arr, kind='stable')
+    locs_sorted = loc_arr[order]
+    if len(locs_sorted) > 0:
+        starts = np.concatenate(([0], np.flatnonzero(locs_sorted[1:] != locs_sorted[:-1]) + 1))
     else:
-        return Paragraph(f"<b><font size=17>{part_no}</font></b>", bold_style_v1)
+        starts = np.array([], dtype=int)
+    bounds = np.append(starts, len(locs_sorted))
+    return order, locs_sorted, starts, bounds
+
+def _split_locations(location_strs):
+    """Split location strings like "12M_ST-140_R_0_2_A_1" into their 7
+    components: one pandas C-level split producing an (n, 7) array of
+    component strings padded with ''."""
+    return (pd.Series(location_strs, dtype=object)
+            .str.strip(' \t\r\n_')
+            .str.split(r'[_\s]+', expand=True, regex=True)
+            .reindex(columns=range(7))
+            .fillna('')
+            .to_numpy())
+
+def _fit_description_v1(desc):
+    """Pick the v1 description font size from the text length, truncating
+    very long descriptions."""
+    font_size = _desc_font_size(len(desc))
+    if font_size == _DESC_SIZES[-1]:
+        # Truncate very long descriptions to prevent overflow
+        desc = desc[:100] + "..." if len(desc) > 100 else desc
 
-def format_part_no_v2(part_no):
-    """Format part number with different font sizes to prevent overlapping."""
-    if not part_no or not isinstance(part_no, str):
-        part_no = str(part_no)
+    return desc, font_size
 
-    if len(part_no) > 5:
-        split_point = len(part_no) - 5
-        part1 = part_no[:split_point]
-        part2 = part_no[-5:]
-        return Paragraph(f"<b><font size=34>{part1}</font><font size=40>{part2}</font></b><br/><br/>", bold_style_v2)
+def _draw_cell(c, x, y, width, height, fill_color=None):
+    """Draw one bordered grid cell with its bottom-left corner at (x, y)."""
+    if fill_color is not None:
+        c.setFillColor(fill_color)
+        c.rect(x, y, width, height, fill=1, stroke=1)
+        c.setFillColor(colors.black)
     else:
-        return Paragraph(f"<b><font size=34>{part_no}</font></b><br/><br/>", bold_style_v2)
-
-def format_description_v1(desc):
-    """Format description text with dynamic font sizing based on length for v1."""
-    if not desc or not isinstance(desc, str):
-        desc = str(desc)
-    
-    # Dynamic font sizing based on description length
-    desc_length = len(desc)
-    
-    if desc_length <= 30:
-        font_size = 15
-    elif desc_length <= 50:
-        font_size = 13
-    elif desc_length <= 70:
-        font_size = 11
-    elif desc_length <= 90:
-        font_size = 10
+        c.rect(x, y, width, height, stroke=1)
+
+def _draw_field_cell(c, x, y, width, height, text):
+    """Draw a field-name cell ('Part No', 'Description', ...) at 16pt."""
+    _draw_cell(c, x, y, width, height)
+    c.setFont('Helvetica', 16)
+    c.drawCentredString(x + width / 2, y + height / 2 - 0.35 * 16, text)
+
+def _draw_text_block(c, lines, x, y_center, font_size, leading):
+    """Draw pre-split text lines left-aligned, vertically centred on y_center."""
+    c.setFont('Helvetica', font_size)
+    baseline = y_center + (len(lines) - 1) * leading / 2 - 0.35 * font_size
+    for line in lines:
+        c.drawString(x, baseline, line)
+        baseline -= leading
+
+def _draw_part_no(c, x, baseline, part_no, small, big, centred=False):
+    """Draw a part number as two bold runs: everything before the last 5
+    characters at `small` pt and the last 5 characters at `big` pt.
+
+    x is the left edge of the run, or its centre when centred=True."""
+    if len(part_no) > 5:
+        head, tail = part_no[:-5], part_no[-5:]
     else:
-        font_size = 9
-        # Truncate very long descriptions to prevent overflow
-        desc = desc[:100] + "..." if len(desc) > 100 else desc
-    
-    # Create a custom style for this description
-    desc_style_v1 = ParagraphStyle(
-        name='Description_v1',
-        fontName='Helvetica',
-        fontSize=font_size,
-        alignment=TA_LEFT,
-        leading=font_size + 2,
-        spaceBefore=1,
-        spaceAfter=1
-    )
-    
-    return Paragraph(desc, desc_style_v1)
+        head, tail = part_no, ''
+    head_width = c.stringWidth(head, 'Helvetica-Bold', small)
+    if centred:
+        x -= (head_width + c.stringWidth(tail, 'Helvetica-Bold', big)) / 2
+    c.setFont('Helvetica-Bold', small)
+    c.drawString(x, baseline, head)
+    if tail:
+        c.setFont('Helvetica-Bold', big)
+        c.drawString(x + head_width, baseline, tail)
+
+def _draw_location_row(c, x, y, location_values, widths, font_size, height):
+    """Draw the coloured location row with its bottom edge at y."""
+    _draw_field_cell(c, x, y, widths[0], height, 'Part Location')
+    cell_x = x + widths[0]
+    baseline = y + height - 3 - 0.8 * font_size
+    for value, width, color in zip(location_values, widths[1:], _LOC_COLORS):
+        _draw_cell(c, cell_x, y, width, height, fill_color=color)
+        c.setFont('Helvetica', font_size)
+        c.drawCentredString(cell_x + width / 2, baseline, str(value))
+        cell_x += width
+
+def _draw_part_block_v1(c, x, y_top, part_no, desc):
+    """Draw one v1 two-row part block (part number + description) with its
+    top edge at y_top; returns the y of its bottom edge."""
+    value_x = x + _FIELD_COL_WIDTH
+    text_x = value_x + _CELL_PADDING
+
+    y = y_top - _PART_NO_HEIGHT_V1
+    _draw_field_cell(c, x, y, _FIELD_COL_WIDTH, _PART_NO_HEIGHT_V1, 'Part No')
+    _draw_cell(c, value_x, y, _VALUE_COL_WIDTH, _PART_NO_HEIGHT_V1)
+    # Centre vertically on whichever run dominates the line
+    line_size = 22 if len(part_no) > 5 else 17
+    _draw_part_no(c, text_x, y + _PART_NO_HEIGHT_V1 / 2 - 0.35 * line_size,
+                  part_no, 17, 22)
+
+    y -= _DESC_LOC_HEIGHT_V1
+    _draw_field_cell(c, x, y, _FIELD_COL_WIDTH, _DESC_LOC_HEIGHT_V1, 'Description')
+    _draw_cell(c, value_x, y, _VALUE_COL_WIDTH, _DESC_LOC_HEIGHT_V1)
+    text, font_size = _fit_description_v1(desc)
+    lines = simpleSplit(text, 'Helvetica', font_size, _VALUE_COL_WIDTH - 2 * _CELL_PADDING)
+    _draw_text_block(c, lines, text_x, y + _DESC_LOC_HEIGHT_V1 / 2, font_size, font_size + 2)
+
+    return y
+
+def _draw_label_v1(c, x, y_top, payload):
+    """Draw one v1 (multiple parts) label with its top edge at y_top.
+
+    Takes a (part_no_1, desc_1, part_no_2, desc_2, location_values) payload
+    tuple so it can run in a worker process."""
+    part_no_1, desc_1, part_no_2, desc_2, location_values = payload
+
+    y = _draw_part_block_v1(c, x, y_top, part_no_1, desc_1)
+    y = _draw_part_block_v1(c, x, y - 0.3 * cm, part_no_2, desc_2)
+
+    # Location row
+    y -= _DESC_LOC_HEIGHT_V1
+    _draw_location_row(c, x, y, location_values, _LOC_WIDTHS_V1, 14, _DESC_LOC_HEIGHT_V1)
+
+def _draw_label_v2(c, x, y_top, payload):
+    """Draw one v2 (single part) label with its top edge at y_top.
+
+    Takes a (part_no, desc, location_values) payload tuple."""
+    part_no, desc, location_values = payload
+    value_x = x + _FIELD_COL_WIDTH
+    text_x = value_x + _CELL_PADDING
+
+    # Part number: centred, top-aligned, 34/40pt runs
+    y = y_top - _PART_NO_HEIGHT_V2
+    _draw_field_cell(c, x, y, _FIELD_COL_WIDTH, _PART_NO_HEIGHT_V2, 'Part No')
+    _draw_cell(c, value_x, y, _VALUE_COL_WIDTH, _PART_NO_HEIGHT_V2)
+    baseline = y + _PART_NO_HEIGHT_V2 - 10 - 0.8 * 40
+    center_x = value_x + _VALUE_COL_WIDTH / 2
+    _draw_part_no(c, center_x, baseline, part_no, 34, 40, centred=True)
+
+    # Description: 20pt with 16pt leading, left-aligned, vertically centred
+    y -= _DESC_HEIGHT_V2
+    _draw_field_cell(c, x, y, _FIELD_COL_WIDTH, _DESC_HEIGHT_V2, 'Description')
+    _draw_cell(c, value_x, y, _VALUE_COL_WIDTH, _DESC_HEIGHT_V2)
+    lines = simpleSplit(desc, 'Helvetica', 20, _VALUE_COL_WIDTH - 2 * _CELL_PADDING)
+    _draw_text_block(c, lines, text_x, y + _DESC_HEIGHT_V2 / 2, 20, 16)
+
+    # Location row
+    y -= 0.3 * cm + _LOC_HEIGHT_V2
+    _draw_location_row(c, x, y, location_values, _LOC_WIDTHS_V2, 16, _LOC_HEIGHT_V2)
+
+# Pool startup isn't worth it for small jobs
+_MIN_PARALLEL_LABELS = 32
+
+MAX_LABELS_PER_PAGE = 4
+
+# Labels per rendered chunk; must be a multiple of MAX_LABELS_PER_PAGE so
+# chunk boundaries fall on page breaks
+_LABELS_PER_CHUNK = 100
+
+def _render_chunk(payloads, draw_label, label_height):
+    """Render one chunk of labels onto its own canvas.
+
+    Returns (pdf_bytes, labels_drawn, failed_indices) where the failed
+    indices are relative to the chunk; a failed label is skipped and the
+    following labels move up, as before."""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    drawn = 0
+    failed = []
+    fresh_page = True
+
+    for k, payload in enumerate(payloads):
+        slot = drawn % MAX_LABELS_PER_PAGE
+        if drawn > 0 and slot == 0 and not fresh_page:
+            c.showPage()
+            fresh_page = True
+        try:
+            draw_label(c, _LABEL_X, _LABEL_TOP - slot * label_height, payload)
+        except Exception:
+            failed.append(k)
+            continue
+        fresh_page = False
+        drawn += 1
 
-def format_description(desc):
-    """Format description text with proper wrapping."""
-    if not desc or not isinstance(desc, str):
-        desc = str(desc)
-    return Paragraph(desc, desc_style)
+    if drawn == 0:
+        return b'', 0, failed
+    c.save()
+    return buffer.getvalue(), drawn, failed
 
-def parse_location_string_v1(location_str):
-    """Parse a location string like "12M - LH -R-0-2-A-1" into its 7 components."""
-    location_parts = [''] * 7
+def _render_chunk_v1(payloads):
+    return _render_chunk(payloads, _draw_label_v1, _LABEL_HEIGHT_V1)
 
-    if not location_str or not isinstance(location_str, str):
-        return location_parts
+def _render_chunk_v2(payloads):
+    return _render_chunk(payloads, _draw_label_v2, _LABEL_HEIGHT_V2)
 
-    location_str = location_str.strip()
-    pattern = r'([^_\s]+)'
-    matches = re.findall(pattern, location_str)
+def _map_chunk_renderer(render_chunk, chunks, total_labels):
+    """Yield the result for each chunk, in order.
 
-    for i, match in enumerate(matches[:7]):
-        location_parts[i] = match
+    Uses a process pool for larger jobs (canvas drawing is pure CPU work
+    with no shared state), falling back to in-process rendering when the
+    job is small or the pool fails.  Results are yielded as they arrive so
+    the caller can report progress while later chunks are still drawing."""
+    done = 0
+    if total_labels >= _MIN_PARALLEL_LABELS and len(chunks) > 1:
+        try:
+            with concurrent.futures.ProcessPoolExecutor() as executor:
+                for result in executor.map(render_chunk, chunks):
+                    yield result
+                    done += 1
+                return
+        except (OSError, ValueError, pickle.PicklingError,
+                concurrent.futures.process.BrokenProcessPool):
+            # Pool start-up failures, unpicklable payloads and workers dying
+            # mid-job all degrade to in-process rendering of whatever is
+            # left below.
+            pass
+    for chunk in chunks[done:]:
+        yield render_chunk(chunk)
+
+def _render_pdf(render_chunk, payloads, unique_locs, progress_bar=None, status_text=None):
+    """Render all labels and return the finished PDF as bytes (or None when
+    no label could be drawn).
+
+    When pypdf is available the job is rendered _LABELS_PER_CHUNK labels at
+    a time (possibly in parallel) and the partial documents concatenated,
+    keeping peak memory bounded by the chunk size; without pypdf everything
+    is drawn on a single canvas."""
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        PdfWriter = None
+
+    total_locations = len(payloads)
+    if total_locations == 0:
+        return None
 
-    return location_parts
+    if PdfWriter is None:
+        chunks = [payloads]
+    else:
+        chunks = [payloads[i:i + _LABELS_PER_CHUNK]
+                  for i in range(0, total_locations, _LABELS_PER_CHUNK)]
 
-def parse_location_string_v2(location_str):
-    """Parse a location string like "12M_ST-140_R_0_2_A_1" into its 7 components."""
-    location_parts = [''] * 7
+    results = _map_chunk_renderer(render_chunk, chunks, total_locations)
 
-    if not location_str or not isinstance(location_str, str):
-        return location_parts
+    chunk_pdfs = []
+    label_count = 0
+    labels_done = 0
+    for chunk_index, (pdf_bytes, drawn, failed) in enumerate(results):
+        offset = chunk_index * _LABELS_PER_CHUNK
+        if status_text:
+            for k in failed:
+                status_text.text(f"Error processing location {unique_locs[offset + k]}")
+        if pdf_bytes:
+            chunk_pdfs.append(pdf_bytes)
+            label_count += drawn
+        labels_done += len(chunks[chunk_index])
+        if progress_bar:
+            progress_bar.progress(labels_done * 100 // total_locations)
+
+    if label_count == 0:
+        return None
 
-    location_str = location_str.strip()
-    pattern = r'([^_\s]+)'
-    matches = re.findall(pattern, location_str)
+    if status_text:
+        status_text.text("Building PDF document...")
 
-    for i, match in enumerate(matches[:7]):
-        location_parts[i] = match
+    if len(chunk_pdfs) == 1:
+        return chunk_pdfs[0]
 
-    return location_parts
+    writer = PdfWriter()
+    for chunk_pdf in chunk_pdfs:
+        writer.append(io.BytesIO(chunk_pdf))
+    merged = io.BytesIO()
+    writer.write(merged)
+    return merged.getvalue()
 
 def generate_labels_from_excel_v1(df, progress_bar=None, status_text=None):
-    """Generate labels using version 1 formatting."""
-    
-    # Create a BytesIO buffer to store the PDF
-    buffer = io.BytesIO()
-    
-    # Set up key measurements
-    part_no_height = 1.3 * cm
-    desc_loc_height = 0.8 * cm
+    """Generate labels using version 1 formatting; returns the PDF bytes."""
 
     # Identify column names in the file
-    cols = df.columns.tolist()
-    df.columns = [col.upper() for col in df.columns]
-    cols = df.columns.tolist()
-
-    # Find columns
-    part_no_col = next((col for col in cols if 'PART' in col and ('NO' in col or 'NUM' in col or '#' in col)),
-                      next((col for col in cols if col in ['PARTNO', 'PART']), None))
-    desc_col = next((col for col in cols if 'DESC' in col), None)
-    loc_col = next((col for col in cols if 'LOC' in col or 'POS' in col), None)
-
-    if not part_no_col:
-        part_no_col = cols[0]
-    if not desc_col:
-        desc_col = cols[1] if len(cols) > 1 else part_no_col
-    if not loc_col:
-        loc_col = cols[2] if len(cols) > 2 else desc_col
+    part_no_col, desc_col, loc_col = find_label_columns(df)
 
     if status_text:
         status_text.text(f"Using columns: Part No: {part_no_col}, Description: {desc_col}, Location: {loc_col}")
 
-    # Group parts by location
-    df_grouped = df.groupby(loc_col)
-    total_locations = len(df_grouped)
-
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-
-    MAX_LABELS_PER_PAGE = 4
-    label_count = 0
-
-    for i, (location, group) in enumerate(df_grouped):
-        try:
-            if progress_bar:
-                progress_value = int((i / total_locations) * 100)
-                progress_bar.progress(progress_value)
-            
-            if status_text:
-                status_text.text(f"Processing location {i+1}/{total_locations}: {location}")
-
-            parts = group.head(2)
-
-            if len(parts) < 2:
-                if len(parts) == 1:
-                    part1 = parts.iloc[0]
-                    part2 = parts.iloc[0]
-                else:
-                    continue
-            else:
-                part1 = parts.iloc[0]
-                part2 = parts.iloc[1]
-
-            if label_count > 0 and label_count % MAX_LABELS_PER_PAGE == 0:
-                elements.append(PageBreak())
-
-            label_count += 1
-
-            part_no_1 = str(part1[part_no_col])
-            desc_1 = str(part1[desc_col])
-            part_no_2 = str(part2[part_no_col])
-            desc_2 = str(part2[desc_col])
-            location_str = str(part1[loc_col])
-            location_values = parse_location_string_v1(location_str)
-
-            # Create tables for both parts with dynamic description formatting
-            part_table = Table(
-                [['Part No', format_part_no_v1(part_no_1)],
-                 ['Description', format_description_v1(desc_1)]],
-                colWidths=[4*cm, 11*cm],
-                rowHeights=[part_no_height, desc_loc_height]
-            )
-
-            part_table.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (0, -1), 'CENTRE'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (0, 0), 'MIDDLE'),
-                ('VALIGN', (1, 0), (1, 0), 'MIDDLE'),
-                ('VALIGN', (0, 1), (0, 1), 'MIDDLE'),
-                ('VALIGN', (1, 1), (1, 1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 5),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (0, -1), 16),
-            ]))
-
-            part_table2 = Table(
-                [['Part No', format_part_no_v1(part_no_2)],
-                 ['Description', format_description_v1(desc_2)]],
-                colWidths=[4*cm, 11*cm],
-                rowHeights=[part_no_height, desc_loc_height]
-            )
-
-            part_table2.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (0, -1), 'CENTRE'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (0, 0), 'MIDDLE'),
-                ('VALIGN', (1, 0), (1, 0), 'MIDDLE'),
-                ('VALIGN', (0, 1), (0, 1), 'MIDDLE'),
-                ('VALIGN', (1, 1), (1, 1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 5),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (0, -1), 16),
-            ]))
-
-            # Location table
-            location_data = [['Part Location'] + location_values]
-            first_col_width = 4 * cm
-            location_widths = [first_col_width]
-            remaining_width = 11 * cm
-            col_proportions = [1.8, 2.7, 1.3, 1.3, 1.3, 1.3, 1.3]
-            total_proportion = sum(col_proportions)
-            adjusted_widths = [w * remaining_width / total_proportion for w in col_proportions]
-            location_widths.extend(adjusted_widths)
-
-            location_table = Table(
-                location_data,
-                colWidths=location_widths,
-                rowHeights=desc_loc_height
-            )
-
-            location_colors = [
-                colors.HexColor('#E9967A'),
-                colors.HexColor('#ADD8E6'),
-                colors.HexColor('#90EE90'),
-                colors.HexColor('#FFD700'),
-                colors.HexColor('#ADD8E6'),
-                colors.HexColor('#E9967A'),
-                colors.HexColor('#90EE90')
-            ]
-
-            location_style = [
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (0, 0), 'TOP'),
-                ('VALIGN', (1, 0), (-1, 0), 'TOP'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (0, 0), 16),
-                ('FONTSIZE', (1, 0), (-1, -1), 14),
-            ]
-
-            for j, color in enumerate(location_colors):
-                location_style.append(('BACKGROUND', (j+1, 0), (j+1, 0), color))
-
-            location_table.setStyle(TableStyle(location_style))
-
-            elements.append(part_table)
-            elements.append(Spacer(1, 0.3 * cm))
-            elements.append(part_table2)
-            elements.append(location_table)
-            elements.append(Spacer(1, 0.2 * cm))
-
-        except Exception as e:
-            if status_text:
-                status_text.text(f"Error processing location {location}: {e}")
-            continue
+    # Group parts by location: pull the three columns out as flat numpy
+    # arrays once and walk sorted group boundaries instead of materializing
+    # a sub-DataFrame per location. Rows without a location are dropped,
+    # matching groupby's dropna behaviour (astype(str) keeps NaN as NaN on
+    # recent pandas, which would break the sort). Note locations sort as
+    # strings here, so purely numeric columns order lexicographically.
+    df = df.dropna(subset=[loc_col])
+    part_arr = df[part_no_col].to_numpy()
+    desc_arr = df[desc_col].to_numpy()
+    loc_arr = df[loc_col].astype(str).to_numpy()
+
+    order, locs_sorted, starts, bounds = _location_groups(loc_arr)
+    total_locations = len(starts)
+
+    # Split every unique location once at the C level instead of running
+    # re.findall per group inside the loop.
+    unique_locs = locs_sorted[starts]
+    loc_parts = _split_locations(unique_locs)
+
+    # Build one payload tuple per location, then construct the label
+    # flowables (possibly on a process pool) and assemble them in order.
+    payloads = []
+    for i, start in enumerate(starts):
+        # Take the first two rows of the group, duplicating a lone row
+        idx1 = order[start]
+        idx2 = order[start + 1] if start + 1 < bounds[i + 1] else idx1
+        payloads.append((str(part_arr[idx1]), str(desc_arr[idx1]),
+                         str(part_arr[idx2]), str(desc_arr[idx2]),
+                         list(loc_parts[i])))
+
+    if status_text and payloads:
+        status_text.text(f"Building {total_locations} labels...")
+
+    pdf_bytes = _render_pdf(_render_chunk_v1, payloads, unique_locs,
+                            progress_bar, status_text)
 
     if progress_bar:
         progress_bar.progress(100)
 
-    if elements:
-        if status_text:
-            status_text.text("Building PDF document...")
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
-    else:
-        if status_text:
-            status_text.text("No labels were generated. Check if the Excel file has the expected columns.")
-        return None
+    if pdf_bytes is None and status_text:
+        status_text.text("No labels were generated. Check if the Excel file has the expected columns.")
+    return pdf_bytes
 
 def generate_labels_from_excel_v2(df, progress_bar=None, status_text=None):
-    """Generate labels using version 2 formatting."""
-    
-    buffer = io.BytesIO()
-    
-    # Set up key measurements
-    part_no_height = 1.9 * cm
-    desc_height = 2.1 * cm
-    loc_height = 0.9 * cm
+    """Generate labels using version 2 formatting; returns the PDF bytes."""
 
     # Identify column names
-    cols = df.columns.tolist()
-    df.columns = [col.upper() for col in df.columns]
-    cols = df.columns.tolist()
-
-    # Find columns
-    part_no_col = next((col for col in cols if 'PART' in col and ('NO' in col or 'NUM' in col or '#' in col)),
-                      next((col for col in cols if col in ['PARTNO', 'PART']), None))
-    desc_col = next((col for col in cols if 'DESC' in col), None)
-    loc_col = next((col for col in cols if 'LOC' in col or 'POS' in col), None)
-
-    if not part_no_col:
-        part_no_col = cols[0]
-    if not desc_col:
-        desc_col = cols[1] if len(cols) > 1 else part_no_col
-    if not loc_col:
-        loc_col = cols[2] if len(cols) > 2 else desc_col
+    part_no_col, desc_col, loc_col = find_label_columns(df)
 
     if status_text:
         status_text.text(f"Using columns: Part No: {part_no_col}, Description: {desc_col}, Location: {loc_col}")
 
-    # Group parts by location
-    df_grouped = df.groupby(loc_col)
-    total_locations = len(df_grouped)
+    # Group parts by location using the same flat-array sweep as v1; only
+    # the first row of each group is rendered here. Rows without a
+    # location are dropped, matching groupby's dropna behaviour.
+    df = df.dropna(subset=[loc_col])
+    part_arr = df[part_no_col].to_numpy()
+    desc_arr = df[desc_col].to_numpy()
+    loc_arr = df[loc_col].astype(str).to_numpy()
 
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
+    order, locs_sorted, starts, _bounds = _location_groups(loc_arr)
+    total_locations = len(starts)
 
-    MAX_LABELS_PER_PAGE = 4
-    label_count = 0
+    # Split every unique location once at the C level instead of running
+    # re.findall per group inside the loop.
+    unique_locs = locs_sorted[starts]
+    loc_parts = _split_locations(unique_locs)
 
-    for i, (location, group) in enumerate(df_grouped):
-        try:
-            if progress_bar:
-                progress_value = int((i / total_locations) * 100)
-                progress_bar.progress(progress_value)
-            
-            if status_text:
-                status_text.text(f"Processing location {i+1}/{total_locations}: {location}")
-
-            parts = group.head(2)
-
-            if len(parts) < 2:
-                if len(parts) == 1:
-                    part1 = parts.iloc[0]
-                else:
-                    continue
-            else:
-                part1 = parts.iloc[0]
-
-            if label_count > 0 and label_count % MAX_LABELS_PER_PAGE == 0:
-                elements.append(PageBreak())
-
-            label_count += 1
-
-            part_no = str(part1[part_no_col])
-            desc = str(part1[desc_col])
-            location_str = str(part1[loc_col])
-            location_values = parse_location_string_v2(location_str)
-
-            # Part table with enhanced formatting
-            part_table = Table(
-                [['Part No', format_part_no_v2(part_no)],
-                 ['Description', format_description(desc)]],
-                colWidths=[4*cm, 11*cm],
-                rowHeights=[part_no_height, desc_height]
-            )
-
-            part_table.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-                ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-                ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (0, 0), 'MIDDLE'),
-                ('VALIGN', (1, 0), (1, 0), 'TOP'),
-                ('VALIGN', (0, 1), (0, 1), 'MIDDLE'),
-                ('VALIGN', (1, 1), (1, 1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 5),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-                ('TOPPADDING', (1, 0), (1, 0), 10),
-                ('BOTTOMPADDING', (1, 0), (1, 0), 5),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (0, -1), 16),
-            ]))
-
-            # Location table
-            location_data = [['Part Location'] + location_values]
-            location_widths = [4*cm]
-            remaining_width = 11 * cm
-            col_widths = [1.7, 2.9, 1.3, 1.2, 1.3, 1.3, 1.3]
-            total_proportion = sum(col_widths)
-            location_widths.extend([w * remaining_width / total_proportion for w in col_widths])
-
-            location_table = Table(
-                location_data,
-                colWidths=location_widths,
-                rowHeights=loc_height,
-            )
-
-            location_colors = [
-                colors.HexColor('#E9967A'),
-                colors.HexColor('#ADD8E6'),
-                colors.HexColor('#90EE90'),
-                colors.HexColor('#FFD700'),
-                colors.HexColor('#ADD8E6'),
-                colors.HexColor('#E9967A'),
-                colors.HexColor('#90EE90')
-            ]
-
-            location_style = [
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (0, 0), 'TOP'),
-                ('VALIGN', (1, 0), (-1, 0), 'TOP'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (0, 0), 16),
-                ('FONTSIZE', (1, 0), (-1, -1), 16),
-            ]
-
-            for j, color in enumerate(location_colors):
-                location_style.append(('BACKGROUND', (j+1, 0), (j+1, 0), color))
-
-            location_table.setStyle(TableStyle(location_style))
-
-            elements.append(part_table)
-            elements.append(Spacer(1, 0.3 * cm))
-            elements.append(location_table)
-            elements.append(Spacer(1, 0.2 * cm))
+    # Build one payload tuple per location, then construct the label
+    # flowables (possibly on a process pool) and assemble them in order.
+    payloads = []
+    for i, start in enumerate(starts):
+        idx1 = order[start]
+        payloads.append((str(part_arr[idx1]), str(desc_arr[idx1]),
+                         list(loc_parts[i])))
 
-        except Exception as e:
-            if status_text:
-                status_text.text(f"Error processing location {location}: {e}")
-            continue
+    if status_text and payloads:
+        status_text.text(f"Building {total_locations} labels...")
+
+    pdf_bytes = _render_pdf(_render_chunk_v2, payloads, unique_locs,
+                            progress_bar, status_text)
 
     if progress_bar:
         progress_bar.progress(100)
 
-    if elements:
-        if status_text:
-            status_text.text("Building PDF document...")
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
-    else:
-        if status_text:
-            status_text.text("No labels were generated.")
-        return None
+    if pdf_bytes is None and status_text:
+        status_text.text("No labels were generated.")
+    return pdf_bytes
+
+def _read_dataframe(source, filename):
+    """Read an uploaded CSV/Excel file into a DataFrame, preferring the
+    compiled parser engines (pyarrow / python-calamine) when installed."""
+    if filename.lower().endswith('.csv'):
+        try:
+            return pd.read_csv(source, engine='pyarrow')
+        except (ImportError, ValueError):
+            source.seek(0)
+            return pd.read_csv(source)
+    try:
+        return pd.read_excel(source, engine='calamine')
+    except (ImportError, ValueError):
+        source.seek(0)
+        return pd.read_excel(source)
+
+@st.cache_data(show_spinner=False)
+def _generate_cached(file_bytes, filename, label_type, _progress_bar=None, _status_text=None):
+    """Run the full read-and-generate pipeline, memoized on the raw file
+    bytes and label type so regenerating the same upload is a cache hit.
+
+    The underscore-prefixed widget arguments are excluded from the cache
+    key; on a hit the progress bar is simply never advanced."""
+    df = _read_dataframe(io.BytesIO(file_bytes), filename)
+    if label_type == "Single Part":
+        return generate_labels_from_excel_v2(df, _progress_bar, _status_text)
+    return generate_labels_from_excel_v1(df, _progress_bar, _status_text)
 
 def main():
     st.title("🏷️ Rack Label Generator")
@@ -517,11 +536,9 @@ def main():
 
     if uploaded_file is not None:
         try:
-            # Read the file
-            if uploaded_file.name.lower().endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
+            # Read the file (for the preview; generation re-reads from the
+            # raw bytes inside the cached pipeline)
+            df = _read_dataframe(uploaded_file, uploaded_file.name)
 
             st.success(f"✅ File loaded successfully! Found {len(df)} rows and {len(df.columns)} columns.")
             
@@ -539,21 +556,21 @@ def main():
                 status_text = st.empty()
                 
                 try:
-                    # Generate PDF based on selected type
+                    # Generate PDF based on selected type (cached per upload)
+                    pdf_bytes = _generate_cached(uploaded_file.getvalue(), uploaded_file.name,
+                                                 label_type, progress_bar, status_text)
                     if label_type == "Single Part":
-                        pdf_buffer = generate_labels_from_excel_v2(df, progress_bar, status_text)
                         filename = "singlepart_labels.pdf"
                     else:
-                        pdf_buffer = generate_labels_from_excel_v1(df, progress_bar, status_text)
                         filename = "multiplepart_labels.pdf"
 
-                    if pdf_buffer:
+                    if pdf_bytes:
                         status_text.text("✅ PDF generated successfully!")
-                        
+
                         # Provide download button
                         st.download_button(
                             label="📥 Download PDF",
-                            data=pdf_buffer.getvalue(),
+                            data=pdf_bytes,
                             file_name=filename,
                             mime="application/pdf",
                             type="primary"